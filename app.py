@@ -1,117 +1,304 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
+import os
+import io
 import re
+import csv
+import codecs
 import unicodedata
 
+# -------------------------
+# 검색용 토큰 처리 (기존 유지)
+# -------------------------
+# 정규식은 모듈 로드 시 한 번만 컴파일
+_RE_PLUS_STAR = re.compile(r'\(\+\s*\d+\s*\)|\+\s*\d+|\b[45]\s*성\b')
+_RE_NON_WORD = re.compile(r'[^\w가-힣]')
+_RE_TOK = re.compile(r'[가-힣]+|[A-Za-z0-9]+')
+
+def tokenize_batch(texts):
+    # 컬럼 전체를 리스트로 받아 한 루프에서 토큰화 (행마다 Series.apply 호출 없음)
+    is_nfkc = unicodedata.is_normalized
+    nfkc = unicodedata.normalize
+    strip_plus_star = _RE_PLUS_STAR.sub
+    find_tokens = _RE_TOK.findall
+
+    out = []
+    for s in texts:
+        if not isinstance(s, str):
+            out.append([])
+            continue
+        if not is_nfkc("NFKC", s):  # 대부분의 행은 이미 NFKC라 quick-check 만으로 통과
+            s = nfkc("NFKC", s)
+        # +숫자 / 4·5성 패턴은 모두 '+' 나 '성'을 포함하므로, 없는 행은 정규식을 건너뜀
+        if '+' in s or '성' in s:
+            s = strip_plus_star(' ', s)
+        # 구두점·공백은 토큰 정규식이 알아서 건너뛰므로 따로 치환하지 않음
+        out.append(find_tokens(s.lower()))
+    return out
+
+def normalize_search_terms(q: str):
+    if not q:
+        return []
+    if not unicodedata.is_normalized("NFKC", q):
+        q = unicodedata.normalize("NFKC", q)
+    return [_RE_NON_WORD.sub('', t.lower()) for t in q.split() if t.strip()]
+
 # -------------------------
 # 데이터 로드 (인코딩 안전)
 # -------------------------
-@st.cache_data
-def load_data(path="accounts.csv"):
-    for enc in ("utf-8-sig", "utf-8", "cp949", "euc-kr"):
+CSV_PATH = "accounts.csv"
+
+def csv_signature(path=CSV_PATH):
+    # CSV가 바뀌면 캐시도 다시 만들도록 (수정 시각, 크기)를 캐시 키로 사용
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime, stat.st_size)
+
+# 텍스트 컬럼만 타입을 고정 (숫자 컬럼은 잘못된 값이 섞여도 읽히도록 추론 후 load_data에서 변환)
+CSV_DTYPES = {"번호": "string[pyarrow]", "캐릭터 목록": "string[pyarrow]", "캐릭터목록": "string[pyarrow]"}
+
+def detect_encoding(raw):
+    # BOM이 있으면 utf-8-sig, 없으면 오류 없이 디코딩되는 첫 인코딩 (CSV 파싱은 한 번만)
+    if raw.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    for enc in ("utf-8", "cp949", "euc-kr"):
         try:
-            return pd.read_csv(path, encoding=enc)
-        except Exception:
+            raw.decode(enc)
+            return enc
+        except UnicodeDecodeError:
             continue
-    return pd.DataFrame()
+    return None
 
-df = load_data()
-if df.empty:
-    st.error("accounts.csv를 불러올 수 없습니다.")
-    st.stop()
+REQUIRED_COLUMNS = ["번호", "한정", "가격", "캐릭터 목록"]
+PASS_COLUMNS = ["패스 갯수", "패스", "패스갯수"]
+USED_COLUMNS = set(REQUIRED_COLUMNS + PASS_COLUMNS + ["캐릭터목록"])
+DISPLAY_COLUMNS = ["번호", "한정", "가격", "패스", "캐릭터 목록"]
+RESULT_PAGE_ROWS = 500
+
+def used_columns(raw, enc):
+    # 헤더 줄만 읽어서 앱이 쓰는 컬럼의 원래 이름(공백 포함)을 고름
+    # (pyarrow 엔진은 usecols에 함수를 받지 않으므로 이름 목록으로 넘김)
+    header = next(csv.reader([raw.split(b"\n", 1)[0].decode(enc).rstrip("\r")]), [])
+    return [c for c in header if c.strip() in USED_COLUMNS] or None
+
+def read_csv_any(path):
+    try:
+        with open(path, "rb") as f:
+            raw = f.read()
+        enc = detect_encoding(raw)
+        if enc is None:
+            return pd.DataFrame()
+        kwargs = dict(encoding=enc, dtype_backend="pyarrow", dtype=CSV_DTYPES, usecols=used_columns(raw, enc))
+        try:
+            return pd.read_csv(io.BytesIO(raw), engine="pyarrow", **kwargs)
+        except pd.errors.ParserError:
+            # pyarrow 엔진은 필드가 모자란 행이 하나라도 있으면 전체를 실패시키므로,
+            # 기본 엔진으로 한 번 더 읽어서 모자란 칸만 NaN으로 채움 (수기로 관리하는 시트라 흔함)
+            return pd.read_csv(io.BytesIO(raw), **kwargs)
+    except Exception:
+        return pd.DataFrame()
+
+def read_enriched(cache_path, sig):
+    # 가공까지 끝난 parquet 사이드카는 만들 때 기록한 CSV 서명이 지금과 같고 app.py 보다 새로울 때만 사용
+    # (mtime 비교만으로는 cp -p / rsync -a 로 더 오래된 CSV를 덮어쓴 경우를 놓침)
+    try:
+        if os.path.getmtime(cache_path) < os.path.getmtime(__file__):
+            return None
+        df = pd.read_parquet(cache_path)
+    except Exception:
+        return None
+    if sig is None or df.attrs.get("csv_signature") != list(sig):
+        return None
+    return df
+
+def load_data(path=CSV_PATH):
+    cache_path = os.path.splitext(path)[0] + ".enriched.parquet"
+    # 서명은 CSV를 읽기 전에 잡아 둠 (읽는 도중 파일이 바뀌면 다음 로드에서 다시 만들어짐)
+    sig = csv_signature(path)
+    df = read_enriched(cache_path, sig)
+    if df is not None:
+        return df
+
+    df = read_csv_any(path)
+    if df.empty:
+        return df
+
+    # 컬럼 이름 보정 (누락 컬럼은 호출하는 쪽에서 안내)
+    df.columns = [c.strip().replace("캐릭터목록", "캐릭터 목록") for c in df.columns]
+    if any(c not in df.columns for c in REQUIRED_COLUMNS):
+        return df
+
+    # 숫자 컬럼은 로드 시 한 번만, 필터/표시에 충분한 좁은 dtype으로 변환
+    # (번호는 "'7-16" 같은 문자열 ID라 그대로 둠)
+    df["가격"] = pd.to_numeric(df["가격"], errors="coerce").astype("float32")
+    df["한정"] = pd.to_numeric(df["한정"], errors="coerce").fillna(0).astype("int16")
+
+    # 패스 갯수: CSV 값 그대로 사용
+    pass_col = next((c for c in PASS_COLUMNS if c in df.columns), None)
+    df["패스"] = pd.to_numeric(df[pass_col], errors="coerce").fillna(0) if pass_col else 0
+    df["패스"] = df["패스"].astype("int16")
+
+    # Arrow 문자열로 보관 (표시할 때 pandas -> Arrow 변환 없이 그대로 전송)
+    df["캐릭터 목록"] = df["캐릭터 목록"].fillna("").astype("string[pyarrow]")
+    df["_tokens"] = tokenize_batch(df["캐릭터 목록"].tolist())
+
+    df.attrs["csv_signature"] = list(sig) if sig else None  # parquet 메타데이터로 함께 저장됨
+    try:
+        df.to_parquet(cache_path, index=False)
+    except Exception:
+        pass  # 읽기 전용 환경이면 사이드카 없이 진행
+    return df
 
 # -------------------------
-# 컬럼 이름 보정
+# 토큰 비트맵 색인 (AND 검색용)
 # -------------------------
-df.columns = [c.strip().replace("캐릭터목록", "캐릭터 목록") for c in df.columns]
-required = ["번호", "한정", "가격", "캐릭터 목록"]
-if any(c not in df.columns for c in required):
-    st.error(f"CSV 컬럼 오류 / 필요: {required}")
-    st.stop()
+def build_token_index(tokens):
+    # 토큰 -> 정수 id 사전(vocab)과, id별 행 소속 비트맵 행렬 (uint64 워드, i번째 행 = i번째 비트)
+    n_words = (len(tokens) + 63) // 64
+    vocab = {}
+    rows, ids = [], []
+    for i, toks in enumerate(tokens):
+        for t in set(toks):
+            rows.append(i)
+            ids.append(vocab.setdefault(t, len(vocab)))
+
+    # vocab x 행 bool 행렬을 거치지 않고 워드에 비트를 바로 세움 (메모리 1/8)
+    rows = np.asarray(rows, dtype=np.int64)
+    bitmaps = np.zeros((len(vocab), n_words), dtype="<u8")
+    np.bitwise_or.at(bitmaps, (ids, rows >> 6), np.left_shift(1, rows & 63).astype("<u8"))
+    return vocab, bitmaps
+
+def token_mask(index, terms, n_rows):
+    # 검색어 id의 비트맵을 모두 AND 한 뒤 행 단위 bool 마스크로 펼침
+    # (색인에 없는 검색어는 run_search 에서 먼저 걸러지므로 terms는 모두 vocab에 있음)
+    vocab, bitmaps = index
+    term_ids = [vocab[t] for t in terms]
+    mask = np.bitwise_and.reduce(bitmaps[term_ids], axis=0)
+    return np.unpackbits(mask.view(np.uint8), bitorder="little")[:n_rows].view(bool)
 
 # -------------------------
-# 검색용 토큰 처리 (기존 유지)
+# 로드 + 색인 (프로세스당 한 번, 모든 세션이 공유)
 # -------------------------
-def normalize_text_for_tokens(s: str):
-    if not isinstance(s, str):
-        return []
-    s = unicodedata.normalize("NFKC", s)
-    s = re.sub(r'\(\+\s*\d+\s*\)|\+\s*\d+|\b[45]\s*성\b', ' ', s)
-    s = re.sub(r'[^\w가-힣]', ' ', s)
-    s = re.sub(r'\s+', ' ', s).strip()
-    return re.findall(r'[가-힣]+|[A-Za-z0-9]+', s.lower())
+@st.cache_resource(max_entries=1)  # 최신 CSV 서명만 다시 읽히므로 이전 df·색인은 바로 버림
+def get_indexed_df(path=CSV_PATH, sig=None):
+    # cache_resource는 복사 없이 같은 객체를 돌려주므로, 반환된 df는 수정하지 말 것
+    df = load_data(path)
+    if "_tokens" not in df.columns:
+        return df, None
+    # 토큰 문자열은 vocab에만 한 번씩 남기고, 행별 토큰 목록은 색인을 만든 뒤 버림
+    index = build_token_index(df["_tokens"])
+    return df.drop(columns="_tokens"), index
 
-def normalize_search_terms(q: str):
-    if not q:
-        return []
-    return [re.sub(r'[^\w가-힣]', '', t.lower()) for t in q.split() if t.strip()]
+data_sig = csv_signature(CSV_PATH)
+df, token_index = get_indexed_df(CSV_PATH, data_sig)
+if df.empty:
+    st.error("accounts.csv를 불러올 수 없습니다.")
+    st.stop()
+
+if any(c not in df.columns for c in REQUIRED_COLUMNS):
+    st.error(f"CSV 컬럼 오류 / 필요: {REQUIRED_COLUMNS}")
+    st.stop()
+
+@st.cache_data(show_spinner=False)
+def pass_bounds(sig=None):
+    # 패스 슬라이더 범위는 데이터가 바뀔 때만 다시 계산
+    return int(df["패스"].min()), int(df["패스"].max())
 
-df["캐릭터 목록"] = df["캐릭터 목록"].fillna("").astype(str)
-df["_tokens"] = df["캐릭터 목록"].apply(normalize_text_for_tokens)
+pass_lo, pass_hi = pass_bounds(data_sig)
 
 # -------------------------
-# 패스 갯수: CSV 값 그대로 사용
+# 검색 (같은 조건이면 캐시된 결과 재사용)
 # -------------------------
-pass_col = next((c for c in ["패스 갯수", "패스", "패스갯수"] if c in df.columns), None)
-df["패스"] = pd.to_numeric(df[pass_col], errors="coerce").fillna(0).astype(int) if pass_col else 0
+@st.cache_data(show_spinner=False, max_entries=128)
+def run_search(query, min_price, max_price, min_limit, min_pass, max_pass, sig=None):
+    # df / token_index 는 모듈 전역을 사용하고, sig 로 CSV가 바뀌면 캐시를 무효화
+    cols = df.columns.get_indexer(DISPLAY_COLUMNS)
+
+    # 정규화한 검색어는 한 번만 만들고 중복은 제거 ("리오 리오" == "리오")
+    terms = frozenset(normalize_search_terms(query))
+    # 색인에 없는 검색어가 하나라도 있으면 숫자 조건을 볼 것도 없이 결과 없음
+    if not terms <= token_index[0].keys():
+        return df.iloc[:0, cols]
+
+    # 조건을 하나의 마스크로 합쳐 한 번만 잘라냄 (원본 df는 복사하지 않음)
+    # numexpr가 설치돼 있으면 비교식을 한 번의 벡터 연산으로 묶어서 평가
+    mask = df.eval(
+        "가격 >= @min_price and 가격 <= @max_price and 한정 >= @min_limit"
+        " and 패스 >= @min_pass and 패스 <= @max_pass"
+    ).to_numpy()
+    if terms:
+        mask = mask & token_mask(token_index, terms, len(df))
+
+    # 인덱스 정렬 없이 위치 기반으로 행·열을 한 번에 잘라냄
+    return df.iloc[np.flatnonzero(mask), cols]
+
+def unknown_terms(query):
+    # 어느 계정에도 없는 검색어 (안내 메시지용)
+    return sorted(t for t in set(normalize_search_terms(query)) - token_index[0].keys() if t)
 
 # -------------------------
 # UI
 # -------------------------
+# 고정 마크업은 모듈 상수로 (session_state로 한 번만 그리면 다음 rerun에 화면에서 사라지므로 매번 그림)
+HEADER_HTML = "<h2 style='text-align:center;'>🎮 계정 검색</h2>"
+USAGE_MD = f"""
+---
+### 사용 방법
+- 캐릭터 이름은 **띄어쓰기로 AND 검색**
+- 가격 단위는 **만원**
+- **패스 갯수는 CSV에 적힌 숫자를 그대로 사용**
+- 결과가 많으면 상위 {RESULT_PAGE_ROWS}개만 표시 (**전체 보기**로 모두 표시)
+- 결과 표 컬럼 순서:
+  **번호 / 한정 / 가격 / 패스 / 캐릭터 목록**
+"""
+
 st.set_page_config(page_title="계정 검색", layout="wide")
-st.markdown("<h2 style='text-align:center;'>🎮 계정 검색</h2>", unsafe_allow_html=True)
+st.markdown(HEADER_HTML, unsafe_allow_html=True)
 
 # -------------------------
-# 검색 조건
+# 검색 조건 (폼으로 묶어서 '검색'을 눌렀을 때만 rerun)
 # -------------------------
-query = st.text_input("", placeholder="예: 히마리 히카리 (띄어쓰기 AND 검색)")
-min_price, max_price = st.slider("가격대 (만원)", 0, 100, (0, 100))
-min_limit = st.number_input("최소 한정 캐릭터 수", 0, 100, 0)
+with st.form("search_form"):
+    query = st.text_input("", placeholder="예: 히마리 히카리 (띄어쓰기 AND 검색)")
+    min_price, max_price = st.slider("가격대 (만원)", 0, 100, (0, 100))
+    min_limit = st.number_input("최소 한정 캐릭터 수", 0, 100, 0)
 
-min_pass, max_pass = st.slider(
-    "패스 갯수",
-    int(df["패스"].min()),
-    int(df["패스"].max()),
-    (int(df["패스"].min()), int(df["패스"].max()))
-)
+    min_pass, max_pass = st.slider("패스 갯수", pass_lo, pass_hi, (pass_lo, pass_hi))
+    submitted = st.form_submit_button("검색")
 
 # -------------------------
 # 검색 실행
 # -------------------------
-if st.button("검색"):
-    result = df.copy()
-
-    result["가격"] = pd.to_numeric(result["가격"], errors="coerce")
-    result = result[(result["가격"] >= min_price) & (result["가격"] <= max_price)]
-
-    result["한정"] = pd.to_numeric(result["한정"], errors="coerce").fillna(0)
-    result = result[result["한정"] >= min_limit]
-
-    result = result[(result["패스"] >= min_pass) & (result["패스"] <= max_pass)]
+# 마지막으로 제출한 조건을 기억해 두어야 '전체 보기' 체크박스로 rerun 돼도 결과가 유지됨
+if submitted:
+    st.session_state["search_args"] = (query, min_price, max_price, min_limit, min_pass, max_pass)
+    st.session_state.pop("show_all", None)  # 새 검색은 다시 상위 일부만 표시
 
-    terms = normalize_search_terms(query)
-    if terms:
-        result = result[result["_tokens"].apply(lambda t: all(x in t for x in terms))]
+if "search_args" in st.session_state:
+    result = run_search(*st.session_state["search_args"], data_sig)
 
     if not result.empty:
         st.write(f"총 {len(result)}개 계정")
+        # 화면에 다 보이지도 않는 행까지 매번 전송하지 않도록 기본은 상위 일부만 표시
+        show_all = len(result) <= RESULT_PAGE_ROWS or st.checkbox("전체 보기", key="show_all")
         st.dataframe(
-            result[["번호", "한정", "가격", "패스", "캐릭터 목록"]],
+            result if show_all else result.head(RESULT_PAGE_ROWS),
             use_container_width=True,
             height=700
         )
+        if not show_all:
+            st.caption(f"상위 {RESULT_PAGE_ROWS}개만 표시 중 — 조건을 좁히거나 '전체 보기'를 선택하세요")
     else:
-        st.warning("조건에 맞는 계정이 없습니다.")
+        missing = unknown_terms(st.session_state["search_args"][0])
+        if missing:
+            st.warning(f"어느 계정에도 없는 캐릭터: {' '.join(missing)}")
+        else:
+            st.warning("조건에 맞는 계정이 없습니다.")
 
 # -------------------------
 # 사용 설명
 # -------------------------
-st.markdown("""
----
-### 사용 방법
-- 캐릭터 이름은 **띄어쓰기로 AND 검색**
-- 가격 단위는 **만원**
-- **패스 갯수는 CSV에 적힌 숫자를 그대로 사용**
-- 결과 표 컬럼 순서:
-  **번호 / 한정 / 가격 / 패스 / 캐릭터 목록**
-""")
+st.markdown(USAGE_MD)